@@ -5,6 +5,18 @@ import os
 import sys
 import zoneinfo
 import re
+import json
+import shlex
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+@functools.cache
+def available_timezones() -> tuple[str, ...]:
+    return tuple(sorted(zoneinfo.available_timezones()))
+
+def write_file(path: str, data: str, mode: str = 'w'):
+    with open(path, mode) as f:
+        f.write(data)
 
 class Partitioning:
     BOOT_SIZE = 512  # MB
@@ -23,9 +35,16 @@ class Partitioning:
         return self.root_partition_size > 0
 
     def get_disk_size(self):
-        result = subprocess.run(['lsblk', '-b', '-n', '-d', '-o', 'SIZE', self.device], capture_output=True, text=True, check=True)
+        result = subprocess.run(['blockdev', '--getsize64', self.device], capture_output=True, text=True, check=True)
         return int(result.stdout.strip()) // (1024 ** 2)
 
+    def get_part_uuid(self, partition):
+        target = os.path.realpath(partition)
+        for name in os.listdir('/dev/disk/by-partuuid'):
+            if os.path.realpath(f'/dev/disk/by-partuuid/{name}') == target:
+                return name
+        raise ValueError(f'Could not find the PARTUUID of {partition}')
+
     def apply(self):
         if self.root_partition_size and self.root_partition_size >= self.remaining_size:
             raise ValueError('Root partition size is too large for the available space.')
@@ -44,23 +63,25 @@ class Partitioning:
         self.create_partitions(root_and_home_size, home_size if self.has_separate_home_partition else None)
 
     def create_partitions(self, root_size, home_size=None):
-        subprocess.run(['parted', self.device, '--script', 'mklabel', 'gpt'], check=True)
-
-        self.create_partition('fat32', 0, self.BOOT_SIZE)  # Boot partition
-        self.create_partition('linux-swap', self.BOOT_SIZE, self.SWAP_SIZE)  # Swap partition
-        self.create_partition('ext4', self.BOOT_SIZE + self.SWAP_SIZE, root_size)  # Root partition
+        commands = ['mklabel', 'gpt']
+        commands += self.mkpart_args('fat32', 0, self.BOOT_SIZE)  # Boot partition
+        commands += self.mkpart_args('linux-swap', self.BOOT_SIZE, self.SWAP_SIZE)  # Swap partition
+        commands += self.mkpart_args('ext4', self.BOOT_SIZE + self.SWAP_SIZE, root_size)  # Root partition
 
         if home_size is not None:
-            self.create_partition('ext4', self.BOOT_SIZE + self.SWAP_SIZE + root_size, home_size)  # Home partition
+            commands += self.mkpart_args('ext4', self.BOOT_SIZE + self.SWAP_SIZE + root_size, home_size)  # Home partition
 
-        self.format_partition(f'{self.device}p1', 'fat32')
-        self.format_partition(f'{self.device}p2', 'swap')
-        self.format_partition(f'{self.device}p3', 'ext4')
+        subprocess.run(['parted', self.device, '--script'] + commands, check=True)
+
+        jobs = [(f'{self.device}p1', 'fat32'), (f'{self.device}p2', 'swap'), (f'{self.device}p3', 'ext4')]
         if home_size:
-            self.format_partition(f'{self.device}p4', 'ext4')
+            jobs.append((f'{self.device}p4', 'ext4'))
+
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            list(executor.map(lambda job: self.format_partition(*job), jobs))
 
-    def create_partition(self, fstype, start, size):
-        subprocess.run(['parted', self.device, '--script', 'mkpart', 'primary', fstype, f'{start}MB', f'{start + size}MB'], check=True)
+    def mkpart_args(self, fstype, start, size):
+        return ['mkpart', 'primary', fstype, f'{start}MB', f'{start + size}MB']
 
     def format_partition(self, partition, fstype):
         if fstype == 'fat32':
@@ -68,16 +89,16 @@ class Partitioning:
         elif fstype == 'swap':
             subprocess.run(['mkswap', partition], check=True)
         elif fstype == 'ext4':
-            subprocess.run(['mkfs.ext4', partition], check=True)
+            subprocess.run(['mkfs.ext4', '-F', '-E', 'lazy_itable_init=1,lazy_journal_init=1', partition], check=True)
 
     def mount(self):
         print('Mounting boot, swap, root (and home if it exists)')
 
         subprocess.run(['mount', f'{self.device}p3', '/mnt'], check=True)
         if self.has_separate_home_partition:
-            subprocess.run(['mkdir', '-p', '/mnt/home'], check=True)
+            os.makedirs('/mnt/home', exist_ok=True)
             subprocess.run(['mount', f'{self.device}p4', '/mnt/home'], check=True)
-        subprocess.run(['mkdir', '-p', '/mnt/boot'], check=True)
+        os.makedirs('/mnt/boot', exist_ok=True)
         subprocess.run(['mount', f'{self.device}p1', '/mnt/boot'], check=True)
         subprocess.run(['swapon', f'{self.device}p2'], check=True)
 
@@ -135,24 +156,31 @@ class PostInstall:
         self.packages = packages
         self.scripts = scripts
     
-    def install_packages(self):
-        subprocess.run(['arch-chroot', '/mnt', 'pacman', '-S', '--noconfirm'] + self.packages)
+    def download_script(self, index, script):
+        script_name = f'{index}-{script.split("/")[-1]}'
+        try:
+            subprocess.run(['curl', '-sS', '--fail', '-o', f'/mnt/tmp/{script_name}', script], check=True)
+            os.chmod(f'/mnt/tmp/{script_name}', 0o755)
+            return script_name
+        except (subprocess.CalledProcessError, OSError):
+            print('Error downloading script', script)
+            return None
 
     def download_and_run_scripts(self):
         os.makedirs('/mnt/tmp', exist_ok=True)
-        for script in self.scripts:
-            script_name = script.split('/')[-1]
+        with ThreadPoolExecutor() as executor:
+            script_names = list(executor.map(self.download_script, range(len(self.scripts)), self.scripts))
+
+        for script, script_name in zip(self.scripts, script_names):
+            if script_name is None:
+                continue
             try:
-                subprocess.run(['curl', '-o', f'/mnt/tmp/{script_name}', script], check=True)
-                subprocess.run(['chmod', '+x', f'/mnt/tmp/{script_name}'], check=True)
                 subprocess.run(['arch-chroot', '/mnt', f'/tmp/{script_name}'], check=True)
-            except:
-                print('Error downloading/running script', script)
-                pass
+            except (subprocess.CalledProcessError, OSError):
+                print('Error running script', script)
 
     def install(self):
         print('Post installation started')
-        self.install_packages()
         self.download_and_run_scripts()
         print('Post installation completed')
 
@@ -181,49 +209,58 @@ class Installer:
     
     def pacstrap(self):
         print('Running pacstrap')
-        subprocess.run(['pacstrap', '/mnt', 'base', 'linux', 'linux-firmware', 'sudo'], check=True)
+        subprocess.run(['pacstrap', '/mnt', 'base', 'linux', 'linux-firmware', 'sudo', 'networkmanager'] + self.post_install.packages, check=True)
 
     def genfstab(self):
         print('Making fstab')
-        with open('/mnt/etc/fstab', 'a') as f:
-            subprocess.run(['genfstab', '-U', '/mnt'], stdout=f, check=True)
+        fstab = subprocess.run(['genfstab', '-U', '/mnt'], capture_output=True, text=True, check=True).stdout
+        write_file('/mnt/etc/fstab', fstab, 'a')
 
     def set_hostname(self):
         print('Setting hostname')
-        with open('/mnt/etc/hostname', 'w') as f:
-            f.write(self.general.hostname)
+        write_file('/mnt/etc/hostname', self.general.hostname)
 
     def edit_sudoers(self):
         print('Editing sudoers')
-        with open('/mnt/etc/sudoers', 'a') as f:
-            f.write('\n%wheel ALL=(ALL:ALL) ALL\n')
+        write_file('/mnt/etc/sudoers', '\n%wheel ALL=(ALL:ALL) ALL\n', 'a')
     
     def make_hosts(self):
         print('Making hosts')
-        with open('/mnt/etc/hosts', 'w') as f:
-            f.write('127.0.0.1\tlocalhost\n')
-            f.write('::1\tlocalhost\n')
-            f.write(f'127.0.1.1\t{self.general.hostname}.localdomain\t{self.general.hostname}\n')
+        hostname = self.general.hostname
+        write_file('/mnt/etc/hosts', f'127.0.0.1\tlocalhost\n::1\tlocalhost\n127.0.1.1\t{hostname}.localdomain\t{hostname}\n')
 
     def setup_time(self):
         print('Setting up time')
-        path = f'/usr/share/zoneinfo/{self.general.timezone.replace("_", "/")}'
-        subprocess.run(['ln', '-sf', path, '/mnt/etc/localtime'], check=True)
-        subprocess.run(['arch-chroot', '/mnt', 'hwclock', '--systohc'], check=True)
+        path = f'/usr/share/zoneinfo/{self.general.timezone}'
+        if not os.path.lexists(f'/mnt{path}'):
+            raise FileNotFoundError(f'Timezone file {path} does not exist')
+        try:
+            os.unlink('/mnt/etc/localtime')
+        except FileNotFoundError:
+            pass
+        os.symlink(path, '/mnt/etc/localtime')
+
+    def sync_hwclock(self):
+        print('Syncing hardware clock')
+        subprocess.run(['hwclock', '--systohc', '--adjfile=/mnt/etc/adjtime'], check=True)
 
     def locale_gen(self):
         print('Generating locale')
-        with open('/mnt/etc/locale.gen', 'a') as f:
-            f.write('en_US.UTF-8 UTF-8\n')
+        write_file('/mnt/etc/locale.gen', 'en_US.UTF-8 UTF-8\n', 'a')
         subprocess.run(['arch-chroot', '/mnt', 'locale-gen'], check=True)
-        with open('/mnt/etc/locale.conf', 'a') as f:
-            f.write('\nLANG=en_US.UTF-8\n')
+        write_file('/mnt/etc/locale.conf', '\nLANG=en_US.UTF-8\n', 'a')
 
     def add_users(self):
         print('Adding users')
+        if not self.general.users:
+            return
+
+        script = 'set -e\n'
         for user in self.general.users:
-            subprocess.run(['arch-chroot', '/mnt', 'useradd', '-m', '-G', 'wheel', user.username], check=True)
-            subprocess.run(['arch-chroot', '/mnt', 'chpasswd'], input=f'{user.username}:{user.password}', text=True, check=True)
+            script += f'useradd -m -G wheel {shlex.quote(user.username)}\n'
+        script += 'chpasswd\n'
+        passwords = ''.join(f'{user.username}:{user.password}\n' for user in self.general.users)
+        subprocess.run(['arch-chroot', '/mnt', 'sh', '-c', script], input=passwords, text=True, check=True)
 
     def lock_root(self):
         print('Locking root account')
@@ -235,30 +272,20 @@ class Installer:
     
     def make_loader_config(self):
         print('Making loader config')
-        with open('/mnt/boot/loader/loader.conf', 'w') as f:
-            f.write('default linux\n')
-            f.write('timeout 3\n')
-            f.write('editor no\n')
+        write_file('/mnt/boot/loader/loader.conf', 'default linux\ntimeout 3\neditor no\n')
     
     def make_boot_entry(self):
         print('Making boot entry')
-        with open('/mnt/boot/loader/entries/linux.conf', 'w') as f:
-            f.write(f'title {Installer.BOOT_ENTRY_TITLE}\n')
-            f.write('linux /vmlinuz-linux\n')
-            f.write('initrd /initramfs-linux.img\n')
-
-            part_uuid = subprocess.run(['blkid', '-s', 'PARTUUID', '-o', 'value', f'{self.partitioning.device}p3'], capture_output=True, text=True, check=True).stdout.strip()
-            f.write(f'options root=PARTUUID={part_uuid} rw\n')
-
-    def setup_bootloader(self):
-        print('Setting up bootloader')
-        self.install_bootloader()
-        self.make_loader_config()
-        self.make_boot_entry()
+        part_uuid = self.partitioning.get_part_uuid(f'{self.partitioning.device}p3')
+        write_file('/mnt/boot/loader/entries/linux.conf', (
+            f'title {Installer.BOOT_ENTRY_TITLE}\n'
+            'linux /vmlinuz-linux\n'
+            'initrd /initramfs-linux.img\n'
+            f'options root=PARTUUID={part_uuid} rw\n'
+        ))
 
     def setup_network(self):
-        print('Installing and enabling network manager')
-        subprocess.run(['arch-chroot', '/mnt', 'pacman', '-S', '--noconfirm', 'networkmanager'], check=True)
+        print('Enabling network manager')
         subprocess.run(['arch-chroot', '/mnt', 'systemctl', 'enable', 'NetworkManager'], check=True)
 
     def install(self):
@@ -267,16 +294,35 @@ class Installer:
         self.partitioning.mount()
         self.pacstrap()
         self.genfstab()
-        self.set_hostname()
-        self.add_users()
-        self.edit_sudoers()
-        self.lock_root()
-        self.make_hosts()
-        self.setup_time()
-        self.locale_gen()
-        self.setup_bootloader()
-        self.setup_network()
-        self.post_install.install()
+
+        with ThreadPoolExecutor(max_workers=1) as hwclock_executor:
+            hwclock_future = hwclock_executor.submit(self.sync_hwclock)
+
+            # bootctl install creates /mnt/boot/loader, which make_loader_config writes into
+            self.install_bootloader()
+
+            # Only plain file writes run in parallel: every arch-chroot mounts
+            # proc, sys, dev, ... under /mnt and would tear down the others' mounts
+            steps = [
+                self.set_hostname,
+                self.edit_sudoers,
+                self.make_hosts,
+                self.setup_time,
+                self.make_loader_config,
+            ]
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(step) for step in steps]
+            for future in futures:
+                future.result()
+
+            self.make_boot_entry()
+            self.locale_gen()
+            self.setup_network()
+            self.add_users()
+            self.lock_root()
+            self.post_install.install()
+
+            hwclock_future.result()
         print('Installation complete!')
 
     def serialize(self):
@@ -301,6 +347,7 @@ class Installer:
 
 class InstallerTextWizard:
     VALID_UNIX = staticmethod(lambda x: x.isalnum() and len(x) > 0)
+    SIZE_RE = re.compile(r'^(\d+(?:\.\d+)?)([MG]?)$')
 
     def clear(self):
         print('\033c', end='')
@@ -332,7 +379,10 @@ class InstallerTextWizard:
     def ask_size(self, prompt: str) -> int:
         def size_filter(value: str):
             value = value.strip().upper()
-            match = re.match(r'^(\d+(?:\.\d+)?)([MG]?)$', value)
+            if value.isdecimal():
+                return int(value)
+
+            match = InstallerTextWizard.SIZE_RE.match(value)
             if not match:
                 print('Please enter a number followed by optional M or G (e.g., 512M, 1G, or just 512)')
                 return False
@@ -344,24 +394,26 @@ class InstallerTextWizard:
         return self.ask(prompt, size_filter)
 
     def choose(self, prompt: str, items: list[str]):
+        lowered = [item.lower() for item in items]
+        current = list(items)
         while True:
-            for i, x in enumerate(items, start=1):
-                print(f'{i}) {x}')
-            choice = input(f'{prompt} (1-{len(items)} or /search): ')
+            sys.stdout.write(''.join(f'{i}) {x}\n' for i, x in enumerate(current, start=1)))
+            sys.stdout.flush()
+            choice = input(f'{prompt} (1-{len(current)} or /search): ')
             if choice.startswith('/'):
                 query = choice[1:].lower()
-                matches = [item for item in items if query in item.lower()]
+                matches = [items[i] for i, lower in enumerate(lowered) if query in lower]
                 if matches:
-                    return self.choose(prompt, matches)
+                    current = matches
                 else:
                     print('No matches found')
             else:
                 try:
                     index = int(choice) - 1
-                    if 0 <= index < len(items):
-                        return items[index]
+                    if 0 <= index < len(current):
+                        return current[index]
                     else:
-                        print(f'Please choose a number between 1 and {len(items)}')
+                        print(f'Please choose a number between 1 and {len(current)}')
                 except ValueError:
                     print('Invalid input, please enter a number or a search query')
 
@@ -406,7 +458,7 @@ class InstallerTextWizard:
         hostname = self.ask('Hostname', InstallerTextWizard.VALID_UNIX)
 
         self.section('Timezone')
-        timezone = self.choose('Timezone', zoneinfo.available_timezones())
+        timezone = self.choose('Timezone', available_timezones())
 
         users = self.collect_users()
         return self.review_general(hostname, timezone, users)
@@ -426,8 +478,9 @@ class InstallerTextWizard:
     def collect_partitioning(self):
         self.section('Partitioning')
         print('Available drives:')
-        lsblk_output = subprocess.run(['lsblk', '-d', '-o', 'NAME,SIZE'], capture_output=True, text=True, check=True).stdout
-        devices = list(filter(None, lsblk_output.strip().split('\n')[1:]))
+        lsblk_output = subprocess.run(['lsblk', '-J', '-d', '-b', '-o', 'NAME,SIZE,TYPE,MODEL'], capture_output=True, text=True, check=True).stdout
+        disks = [d for d in json.loads(lsblk_output)['blockdevices'] if d['type'] == 'disk']
+        devices = [f'{d["name"]}  {int(d["size"]) // (1024 ** 3)}G  {d.get("model") or ""}'.strip() for d in disks]
         device = '/dev/' + self.choose('Device', devices).split()[0]
 
         if not self.ask_yn('Do you want a separate /home partition? (Y/n) '):